@@ -20,8 +20,7 @@ def main() -> None:
     xml_file = Path("/home/catalin/work/libanaf/dlds/3427868701_4268760695.xml")
 
     parser = etree.XMLParser()
-    with xml_file.open("r", encoding="utf8") as stream:
-        root = etree.fromstring(bytes(stream.read(), encoding="utf8"), parser)
+    root = etree.fromstring(xml_file.read_bytes(), parser)
 
     xml = etree.tostring(root, pretty_print=True)
     pprint(xml.decode())
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from asyncio import AbstractEventLoop
 from datetime import datetime
@@ -73,8 +74,6 @@ def list_invoices(
     filter: Optional[Filter] = Filter.P,
 ) -> None:
     try:
-        import asyncio
-
         loop: AbstractEventLoop = asyncio.get_event_loop()
         func: Callable[
             [Optional[int], Optional[int], Optional[Filter]],
@@ -1,7 +1,9 @@
 import asyncio
 import json
 import logging
+import os
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from os import read
 from pathlib import Path
 from sys import exc_info
@@ -11,7 +13,6 @@ import aiofiles
 import typer
 from httpx import AsyncClient, HTTPStatusError, ReadTimeout, Response, Timeout
 from lxml.etree import XMLSyntaxError
-from pydantic import ValidationError
 from pydantic_xml import ParsingError
 from rich.console import Console
 from rich.progress import (
@@ -25,41 +26,35 @@ from rich.progress import (
 from libanaf.comms import make_auth_client
 from libanaf.config import Configuration
 
-from ..ubl.invoice import Invoice
+from ..ubl.invoice import Invoice, parse_ubl_invoice
 
 config: dict[str, Any] = Configuration().load_config()
 logger: logging.Logger = logging.getLogger(__name__)
 
 
-async def get_pdf_path(xml_path: Path) -> Path:
+def get_pdf_path(xml_path: Path) -> Path:
     outfname = xml_path.stem + '.pdf'
 
-    async with aiofiles.open(xml_path, "r", encoding="utf8") as xml_file:
-        try:
-            # logger.debug(f"Processing {xml_path}")
-            content = await xml_file.read()
-            invoice: Invoice = Invoice.from_xml(bytes(content, encoding="utf8"))
-
-            if invoice is not None:
-                fname = invoice.tofname()
-                outfname = xml_path.stem + '_' + fname + '.pdf'
-
-            # if invoice.has_attachment():
-            #     invoice.write_attachment(xml_path.parent / outfname)
-            #     return None
-
-        except ValidationError as e:
-            logger.error(f"Invoice {xml_path}: {e}", exc_info=e)
-        except XMLSyntaxError as e:
-            logger.error(f"XML Syntax error {xml_path}: {e}", exc_info=e)
-        except ParsingError as e:
-            logger.error(f"XML Parse error {xml_path}: {e}", exc_info=e)
-        except asyncio.CancelledError as e:
-            # TODO: should we treat this specially or not ?
-            logger.error(f"asyncio ERROR {xml_path}", exc_info=e)
-            pass
-        except Exception as e:
-            logger.error(f"XML UNKNOWN error {xml_path}: {e}", exc_info=e)
+    try:
+        # logger.debug(f"Processing {xml_path}")
+        # only the name is needed here, the lightweight parse skips the model walk and validation;
+        # it reports a missing or malformed field as a ParsingError
+        invoice: Invoice = parse_ubl_invoice(xml_path, full=False)
+
+        if invoice is not None:
+            fname = invoice.tofname
+            outfname = xml_path.stem + '_' + fname + '.pdf'
+
+        # if invoice.has_attachment:
+        #     invoice.write_attachment(xml_path.parent / outfname)
+        #     return None
+
+    except XMLSyntaxError as e:
+        logger.error(f"XML Syntax error {xml_path}: {e}", exc_info=e)
+    except ParsingError as e:
+        logger.error(f"XML Parse error {xml_path}: {e}", exc_info=e)
+    except Exception as e:
+        logger.error(f"XML UNKNOWN error {xml_path}: {e}", exc_info=e)
 
     return xml_path.parent / outfname
 
@@ -75,11 +70,11 @@ async def convert_to_pdf(client: AsyncClient, xml: Path, pdf: Path, semaphore: a
 
         url = config["efactura"]["xml2pdf_url"]
         headers = {'Content-Type': 'text/plain'}
-        async with aiofiles.open(xml, 'r') as f:
+        async with aiofiles.open(xml, 'rb') as f:
             data = await f.read()
 
         try:
-            response: Response = await client.post(url=url, headers=headers, data = data, timeout=30.0) # use 30s timeout for slow moving requests
+            response: Response = await client.post(url=url, headers=headers, content=data, timeout=30.0) # use 30s timeout for slow moving requests
 
             if response.status_code != 200:
                 logger.error(f"Unexpected HTTP status code {response.status_code} {response.reason_phrase}")
@@ -188,6 +183,18 @@ def unzip_invoices(download_dir: Path) -> None:
             logger.error(f"Zip File {zip_file} is malformed: {e}. Moving on ...")
 
 
+def list_xml_files(directory: Path) -> list[Path]:
+    """
+    The non-empty `*.xml` files in `directory`, using the `DirEntry` data `os.scandir` already
+    has instead of globbing. Zero byte files hold no invoice to parse and are skipped.
+    """
+    with os.scandir(directory) as entries:
+        return [
+            Path(entry.path) for entry in entries
+            if entry.name.endswith(".xml") and entry.is_file() and entry.stat().st_size > 0
+        ]
+
+
 def process_invoices():
     """
     Process downloaded invoices: unpack the zip file and convert XML to PDF.
@@ -196,11 +203,12 @@ def process_invoices():
 
     unzip_invoices(download_dir=download_dir)
 
-    files_to_process: Dict[Path, Path] = {}
-    for xml_file in download_dir.glob("*.xml"):
-        pdf_file: Path = asyncio.run(get_pdf_path(xml_file))
-        if not pdf_file.exists():
-            files_to_process[xml_file] = pdf_file
+    xml_files: list[Path] = list_xml_files(download_dir)
+    files_to_process: dict[Path, Path] = {}
+    with ProcessPoolExecutor() as executor:
+        for xml_file, pdf_file in zip(xml_files, executor.map(get_pdf_path, xml_files, chunksize=16)):
+            if not pdf_file.exists():
+                files_to_process[xml_file] = pdf_file
 
     semaphore = asyncio.Semaphore(2)
     asyncio.run(process_invoices_async(files_to_process=files_to_process, semaphore=semaphore))
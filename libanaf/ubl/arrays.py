@@ -0,0 +1,42 @@
+"""
+Column oriented (structure of arrays) views over parsed invoices.
+
+The pydantic models stay the parse-time representation; these views are for aggregating over
+large batches (e.g. summing line amounts over thousands of invoices), where reading one field
+out of every model is far slower than scanning a packed array of doubles.
+"""
+
+from array import array
+from typing import Iterable, List
+
+from libanaf.ubl.cac import InvoiceLine
+from libanaf.ubl.invoice import Invoice
+
+
+class InvoiceLineArray:
+    """
+    The invoice lines of many invoices, one column per field.
+
+    Row `i` of every column describes the same line; `invoice_id` tells which invoice it belongs to.
+    """
+
+    def __init__(self, lines: List[InvoiceLine], invoice_ids: List[str]) -> None:
+        self.invoice_id: List[str] = list(invoice_ids)
+        self.id: List[str] = [line.id for line in lines]
+        self.invoiced_quantity: array = array("d", [line.invoiced_quantity for line in lines])
+        # the models keep amounts as Decimal, the columns trade that exactness for packed doubles
+        self.line_extension_amount: array = array("d", [float(line.line_extension_amount) for line in lines])
+        self.price_amount: array = array("d", [float(line.price.price_amount) for line in lines])
+
+    @classmethod
+    def from_invoices(cls, invoices: Iterable[Invoice]) -> "InvoiceLineArray":
+        lines: List[InvoiceLine] = []
+        invoice_ids: List[str] = []
+        for invoice in invoices:
+            lines.extend(invoice.invoice_line)
+            invoice_ids.extend([invoice.id] * len(invoice.invoice_line))
+
+        return cls(lines, invoice_ids)
+
+    def __len__(self) -> int:
+        return len(self.id)
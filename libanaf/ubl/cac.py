@@ -1,54 +1,96 @@
-from typing import List, Optional
-
+import base64
+import sys
+from decimal import Decimal
+from functools import cached_property
+from pathlib import Path
+from typing import Any, List, Mapping, Optional, Self
+
+from pydantic import ConfigDict, field_validator
 from pydantic_xml import BaseXmlModel, attr, element, wrapped
 
 from libanaf.ubl.types import NSMAP
 
 
-class Country(BaseXmlModel, tag="Country", ns="cac", nsmap=NSMAP):
-    identification_code: str = element(tag="IdentificationCode", ns="cbc", nsmap=NSMAP)
+def cbc(tag: str, **kwargs: Any) -> Any:
+    """An `element()` in the CommonBasicComponents (`cbc`) namespace."""
+    return element(tag=tag, ns="cbc", nsmap=NSMAP, **kwargs)
+
+
+def cac(tag: str, **kwargs: Any) -> Any:
+    """An `element()` in the CommonAggregateComponents (`cac`) namespace."""
+    return element(tag=tag, ns="cac", nsmap=NSMAP, **kwargs)
+
+
+def intern_code(value: Optional[str]) -> Optional[str]:
+    """Validator for low-cardinality codes: every parsed document shares one string per code value."""
+    return sys.intern(value) if value else value
+
+
+class FrozenXmlModel(BaseXmlModel):
+    """
+    Base of the UBL models. Parsed documents are read-only, which is what lets values derived from
+    them (`Invoice.tofname`, `Invoice.has_attachment`, ...) be cached on the instances; a changed
+    document is made with `model_copy(update=...)`, which leaves those caches behind.
+    """
+    model_config = ConfigDict(frozen=True)
+
+    def model_copy(self, *, update: Optional[Mapping[str, Any]] = None, deep: bool = False) -> Self:
+        copy = super().model_copy(update=update, deep=deep)
+        # cached_property values live in the instance __dict__, which model_copy() copies along
+        for klass in type(self).__mro__:
+            for name, value in vars(klass).items():
+                if isinstance(value, cached_property):
+                    copy.__dict__.pop(name, None)
+
+        return copy
+
 
+class Country(FrozenXmlModel, tag="Country", ns="cac", nsmap=NSMAP):
+    identification_code: str = cbc("IdentificationCode")
 
-class PostalAddress(BaseXmlModel, tag="PostalAddress", search_mode="unordered", ns="cac", nsmap=NSMAP):
-    street_name: str = element(tag="StreetName", ns="cbc", nsmap=NSMAP)
-    additional_street_name: Optional[str] = element(tag="AdditionalStreetName", default=None, ns="cbc", nsmap=NSMAP)
-    city_name: str = element(tag="CityName", ns="cbc", nsmap=NSMAP)
-    postal_zone: Optional[str] = element(tag="PostalZone", default=None, ns="cbc", nsmap=NSMAP)
-    country_subentity: str = element(tag="CountrySubentity", ns="cbc", nsmap=NSMAP)
+
+class PostalAddress(FrozenXmlModel, tag="PostalAddress", search_mode="unordered", ns="cac", nsmap=NSMAP):
+    street_name: str = cbc("StreetName")
+    additional_street_name: Optional[str] = cbc("AdditionalStreetName", default=None)
+    city_name: str = cbc("CityName")
+    postal_zone: Optional[str] = cbc("PostalZone", default=None)
+    country_subentity: str = cbc("CountrySubentity")
     country: Country
-    address_line: Optional[List[str]] = wrapped("AddressLine", default=None, ns="cac", nsmap=NSMAP, entity=element(tag="Line", default=None, ns="cbc", nsmap=NSMAP))
+    address_line: Optional[List[str]] = wrapped("AddressLine", default=None, ns="cac", nsmap=NSMAP, entity=cbc("Line", default=None))
+
 
+class PartyIdentification(FrozenXmlModel, tag="PartyIdentification", ns="cac", nsmap=NSMAP):
+    id: Optional[str] = cbc("ID", default=None)
 
-class PartyIdentification(BaseXmlModel, tag="PartyIdentification", ns="cac", nsmap=NSMAP):
-    id: Optional[str] = element(tag="ID", default=None, ns="cbc", nsmap=NSMAP)
 
+class PartyName(FrozenXmlModel, tag="PartyName", ns="cac", nsmap=NSMAP):
+    name: str = cbc("Name")
 
-class PartyName(BaseXmlModel, tag="PartyName", ns="cac", nsmap=NSMAP):
-    name: str = element(tag="Name", ns="cbc", nsmap=NSMAP)
 
+class TaxScheme(FrozenXmlModel, tag="TaxScheme", ns="cac", nsmap=NSMAP):
+    id: Optional[str] = cbc("ID", default=None)
 
-class TaxScheme(BaseXmlModel, tag="TaxScheme", ns="cac", nsmap=NSMAP):
-    id: Optional[str] = element(tag="ID", default=None, ns="cbc", nsmap=NSMAP)
+    _intern_codes = field_validator("id")(intern_code)
 
 
-class PartyTaxScheme(BaseXmlModel, tag="PartyTaxScheme", ns="cac", nsmap=NSMAP):
-    company_id: Optional[str] = element(tag="CompanyID", default=None, ns="cbc", nsmap=NSMAP)
+class PartyTaxScheme(FrozenXmlModel, tag="PartyTaxScheme", ns="cac", nsmap=NSMAP):
+    company_id: Optional[str] = cbc("CompanyID", default=None)
     tax_scheme: Optional[TaxScheme] = None
 
 
-class PartyLegalEntity(BaseXmlModel, tag="PartyLegalEntity", ns="cac", nsmap=NSMAP):
-    registration_name: Optional[str] = element(tag="RegistrationName", default=None, ns="cbc", nsmap=NSMAP)
-    company_id: Optional[str] = element(tag="CompanyID", default=None, ns="cbc", nsmap=NSMAP)
+class PartyLegalEntity(FrozenXmlModel, tag="PartyLegalEntity", ns="cac", nsmap=NSMAP):
+    registration_name: Optional[str] = cbc("RegistrationName", default=None)
+    company_id: Optional[str] = cbc("CompanyID", default=None)
 
 
-class PartyContact(BaseXmlModel, tag="Contact", ns="cac", nsmap=NSMAP):
-    name: Optional[str] = element(tag="Name", default=None, ns="cbc", nsmap=NSMAP)
-    telephone: Optional[str] = element(tag="Telephone", default=None, ns="cbc", nsmap=NSMAP)
-    electronic_mail: Optional[str] = element(tag="ElectronicMail", default=None, ns="cbc", nsmap=NSMAP)
+class PartyContact(FrozenXmlModel, tag="Contact", ns="cac", nsmap=NSMAP):
+    name: Optional[str] = cbc("Name", default=None)
+    telephone: Optional[str] = cbc("Telephone", default=None)
+    electronic_mail: Optional[str] = cbc("ElectronicMail", default=None)
 
 
-class Party(BaseXmlModel, tag="Party", search_mode="unordered", ns="cac", nsmap=NSMAP):
-    endpoint_id: Optional[str] = element(tag="EndpointID", default=None, ns="cbc", nsmap=NSMAP)
+class Party(FrozenXmlModel, tag="Party", search_mode="unordered", ns="cac", nsmap=NSMAP):
+    endpoint_id: Optional[str] = cbc("EndpointID", default=None)
     party_identification: Optional[PartyIdentification] = None
     party_name: Optional[PartyName] = None
     postal_address: PostalAddress
@@ -57,97 +99,135 @@ class Party(BaseXmlModel, tag="Party", search_mode="unordered", ns="cac", nsmap=
     contact: Optional[PartyContact] = None
 
 
-class Price(BaseXmlModel, tag="Price", ns="cac", nsmap=NSMAP):
-    price_amount: float = element(tag="PriceAmount", ns="cbc", nsmap=NSMAP)
-    base_quantity: Optional[float] = element(tag="BaseQuantity", default=1.0, ns="cbc", nsmap=NSMAP)
+class Price(FrozenXmlModel, tag="Price", ns="cac", nsmap=NSMAP):
+    price_amount: Decimal = cbc("PriceAmount")
+    base_quantity: Optional[float] = cbc("BaseQuantity", default=1.0)
 
 
-class ClassifiedTaxCategory(BaseXmlModel, tag="ClassifiedTaxCategory", ns="cac", nsmap=NSMAP):
-    id: str = element(tag="ID", ns="cbc", nsmap=NSMAP)
-    percent: Optional[float] = element(tag="Percent", default=None, ns="cbc", nsmap=NSMAP)
+class ClassifiedTaxCategory(FrozenXmlModel, tag="ClassifiedTaxCategory", ns="cac", nsmap=NSMAP):
+    id: str = cbc("ID")
+    percent: Optional[float] = cbc("Percent", default=None)
     tax_scheme: Optional[TaxScheme] = None
 
+    _intern_codes = field_validator("id")(intern_code)
+
 
-class OrderLineReference(BaseXmlModel, tag="OrderLineReference", ns="cac", nsmap=NSMAP):
-    line_id: Optional[str] = element(tag="LineID", default=None, ns="cbc", nsmap=NSMAP)
+class OrderLineReference(FrozenXmlModel, tag="OrderLineReference", ns="cac", nsmap=NSMAP):
+    line_id: Optional[str] = cbc("LineID", default=None)
 
 
-class CommodityClassification(BaseXmlModel, tag="CommodityClassification", ns="cac", nsmap=NSMAP):
-    item_classification_code: Optional[str] = element(tag="ItemClassificationCode", default="None", ns="cbc", nsmap=NSMAP)
+class CommodityClassification(FrozenXmlModel, tag="CommodityClassification", ns="cac", nsmap=NSMAP):
+    item_classification_code: Optional[str] = cbc("ItemClassificationCode", default="None")
     list_id: Optional[str] = wrapped("ItemClassificationCode", ns="cbc", nsmap=NSMAP, default=None, entity=attr("listID"))
 
+    _intern_codes = field_validator("item_classification_code", "list_id")(intern_code)
 
-class Item(BaseXmlModel, tag="Item", search_mode="unordered", ns="cac", nsmap=NSMAP):
-    name: str = element(tag="Name", ns="cbc", nsmap=NSMAP)
-    seller_item_id: Optional[str] = wrapped("SellersItemIdentification", ns="cac", nsmap=NSMAP, default=None, entity=element(tag="ID", default=None, ns="cbc", nsmap=NSMAP))
-    origin_country: Optional[str] = wrapped("OriginCountry", ns="cac", nsmap=NSMAP, default=None, entity=element("IdentificationCode", default=None, ns="cbc", nsmap=NSMAP))
+
+class Item(FrozenXmlModel, tag="Item", search_mode="unordered", ns="cac", nsmap=NSMAP):
+    name: str = cbc("Name")
+    seller_item_id: Optional[str] = wrapped("SellersItemIdentification", ns="cac", nsmap=NSMAP, default=None, entity=cbc("ID", default=None))
+    origin_country: Optional[str] = wrapped("OriginCountry", ns="cac", nsmap=NSMAP, default=None, entity=cbc("IdentificationCode", default=None))
     commodity_classification: Optional[CommodityClassification] = None
     classified_tax_category: ClassifiedTaxCategory
 
 
-class InvoiceLine(BaseXmlModel, tag="InvoiceLine", search_mode="unordered", ns="cac", nsmap=NSMAP):
-    id: str = element(tag="ID", ns="cbc", nsmap=NSMAP)
-    note: Optional[List[str]] = element(tag="Note", default=None, ns="cbc", nsmap=NSMAP)
-    invoiced_quantity: float = element(tag="InvoicedQuantity", ns="cbc", nsmap=NSMAP)
-    line_extension_amount: float = element(tag="LineExtensionAmount", ns="cbc", nsmap=NSMAP)
+class InvoiceLine(FrozenXmlModel, tag="InvoiceLine", search_mode="unordered", ns="cac", nsmap=NSMAP):
+    id: str = cbc("ID")
+    note: Optional[List[str]] = cbc("Note", default=None)
+    invoiced_quantity: float = cbc("InvoicedQuantity")
+    line_extension_amount: Decimal = cbc("LineExtensionAmount")
     order_line_reference: Optional[OrderLineReference] = None
-    item: Item = element(tag="Item", ns="cac", nsmap=NSMAP)
-    price: Price = element(tag="Price", ns="cac", nsmap=NSMAP)
+    item: Item = cac("Item")
+    price: Price = cac("Price")
 
 
-class TaxCategory(BaseXmlModel, tag="TaxCategory", search_mode="unordered", ns="cac", nsmap=NSMAP):
-    id: Optional[str] = element(tag="ID", default=None, ns="cbc", nsmap=NSMAP)
-    tax_exempt_reason_code: Optional[str] = element(tag="TaxExemptionReasonCode", default=None, ns="cbc", nsmap=NSMAP)
-    tax_exempt_reason: Optional[str] = element(tag="TaxExemptionReason", default=None, ns="cbc", nsmap=NSMAP)
+class TaxCategory(FrozenXmlModel, tag="TaxCategory", search_mode="unordered", ns="cac", nsmap=NSMAP):
+    id: Optional[str] = cbc("ID", default=None)
+    tax_exempt_reason_code: Optional[str] = cbc("TaxExemptionReasonCode", default=None)
+    tax_exempt_reason: Optional[str] = cbc("TaxExemptionReason", default=None)
     tax_scheme: TaxScheme
 
-
-class TaxSubtotal(BaseXmlModel, tag="TaxSubtotal", ns="cac", nsmap=NSMAP):
-    taxable_amount: float = element(tag="TaxableAmount", ns="cbc", nsmap=NSMAP)
-    tax_amount: float = element(tag="TaxAmount", ns="cbc", nsmap=NSMAP)
+    _intern_codes = field_validator("id", "tax_exempt_reason_code")(intern_code)
 
 
-class TaxTotal(BaseXmlModel, tag="TaxTotal", ns="cac", nsmap=NSMAP):
-    tax_amount: float = element(tag="TaxAmount", ns="cbc", nsmap=NSMAP)
-    tax_subtotal: TaxSubtotal
-
-
-class LegalMonetaryTotal(BaseXmlModel, tag="LegalMonetaryTotal", search_mode="unordered", ns="cac", nsmap=NSMAP):
-    line_extension_amount: Optional[float] = element(tag="LineExtensionAmount", default=0.0, ns="cbc", nsmap=NSMAP)
-    tax_exclusive_amount: Optional[float] = element(tag="TaxExclusiveAmount", default=0.0, ns="cbc", nsmap=NSMAP)
-    tax_inclusive_amount: Optional[float] = element(tag="TaxInclusiveAmount", default=0.0, ns="cbc", nsmap=NSMAP)
-    allowance_total_amount: Optional[float] = element(tag="AllowanceTotalAmount", default=0.0, ns="cbc", nsmap=NSMAP)
-    charge_total_amount: Optional[float] = element(tag="ChargeTotalAmount", default=0.0, ns="cbc", nsmap=NSMAP)
-    prepaid_amount: Optional[float] = element(tag="PrepaidAmount", default=0.0, ns="cbc", nsmap=NSMAP)
-    payable_rounding_amount: Optional[float] = element(tag="PayableRoundingAmount", default=0.0, ns="cbc", nsmap=NSMAP)
-    payable_amount: float = element(tag="PayableAmount", ns="cbc", nsmap=NSMAP)
+class TaxSubtotal(FrozenXmlModel, tag="TaxSubtotal", ns="cac", nsmap=NSMAP):
+    taxable_amount: Decimal = cbc("TaxableAmount")
+    tax_amount: Decimal = cbc("TaxAmount")
 
 
-class Attachment(BaseXmlModel, tag="Attachment", ns="cac", nsmap=NSMAP):
-    embedded_binary_document: bytes = element("EmbeddedDocumentBinaryObject", ns="cbc", nsmap=NSMAP)
+class TaxTotal(FrozenXmlModel, tag="TaxTotal", ns="cac", nsmap=NSMAP):
+    tax_amount: Decimal = cbc("TaxAmount")
+    tax_subtotal: TaxSubtotal
 
 
-class AdditionalDocumentReference(BaseXmlModel, tag="AdditionalDocumentReference", ns="cac", nsmap=NSMAP):
-    id: Optional[str] = element(tag="ID", default=None, ns="cbc", nsmap=NSMAP)
+class LegalMonetaryTotal(FrozenXmlModel, tag="LegalMonetaryTotal", search_mode="unordered", ns="cac", nsmap=NSMAP):
+    line_extension_amount: Optional[Decimal] = cbc("LineExtensionAmount", default=Decimal(0))
+    tax_exclusive_amount: Optional[Decimal] = cbc("TaxExclusiveAmount", default=Decimal(0))
+    tax_inclusive_amount: Optional[Decimal] = cbc("TaxInclusiveAmount", default=Decimal(0))
+    allowance_total_amount: Optional[Decimal] = cbc("AllowanceTotalAmount", default=Decimal(0))
+    charge_total_amount: Optional[Decimal] = cbc("ChargeTotalAmount", default=Decimal(0))
+    prepaid_amount: Optional[Decimal] = cbc("PrepaidAmount", default=Decimal(0))
+    payable_rounding_amount: Optional[Decimal] = cbc("PayableRoundingAmount", default=Decimal(0))
+    payable_amount: Decimal = cbc("PayableAmount")
+
+
+class Attachment(FrozenXmlModel, tag="Attachment", ns="cac", nsmap=NSMAP):
+    # kept as the raw base64 text, the embedded PDF is only decoded when asked for
+    embedded_binary_document: Optional[str] = cbc("EmbeddedDocumentBinaryObject", default=None)
+
+    @cached_property
+    def embedded_binary_document_bytes(self) -> bytes:
+        if self.embedded_binary_document is None:
+            return b""
+
+        return base64.b64decode(self.embedded_binary_document)
+
+    def write_to(self, destination: Path, chunk_size: int = 64 * 1024) -> None:
+        """
+        Decode the embedded document into `destination` a chunk at a time, so the
+        decoded payload is never held in memory as a whole.
+        """
+        encoded: Optional[str] = self.embedded_binary_document
+        if encoded is None:
+            raise ValueError("attachment has no embedded document to write")
+
+        pending: str = ""
+        # a 1 MiB buffer coalesces the decoded chunks, a typical PDF goes out in a single write
+        with open(destination, "wb", buffering=1 << 20) as dest:
+            for start in range(0, len(encoded), chunk_size):
+                # drop the line breaks producers wrap base64 with, then decode whole 4 char groups only
+                chunk = pending + "".join(encoded[start:start + chunk_size].split())
+                usable = len(chunk) - len(chunk) % 4
+                dest.write(base64.b64decode(chunk[:usable]))
+                pending = chunk[usable:]
+
+            if pending:
+                dest.write(base64.b64decode(pending))
+
+
+class AdditionalDocumentReference(FrozenXmlModel, tag="AdditionalDocumentReference", ns="cac", nsmap=NSMAP):
+    id: Optional[str] = cbc("ID", default=None)
     attachment: Optional[Attachment] = None
 
 
-class OrderReference(BaseXmlModel, tag="OrderReference", ns="cac", nsmap=NSMAP):
-    id: Optional[str] = element(tag="ID", default=None, ns="cbc", nsmap=NSMAP)
-    sales_order_id: Optional[str] = element(tag="SalesOrderID", default=None, ns="cbc", nsmap=NSMAP)
+class OrderReference(FrozenXmlModel, tag="OrderReference", ns="cac", nsmap=NSMAP):
+    id: Optional[str] = cbc("ID", default=None)
+    sales_order_id: Optional[str] = cbc("SalesOrderID", default=None)
 
 
-class FinancialInstitutionBranch(BaseXmlModel, tag="FinancialInstitutionBranch", ns="cac", nsmap=NSMAP):
-    id: Optional[str] = element(name="ID", default=None, ns="cbc", nsmap=NSMAP)
+class FinancialInstitutionBranch(FrozenXmlModel, tag="FinancialInstitutionBranch", ns="cac", nsmap=NSMAP):
+    id: Optional[str] = cbc("ID", default=None)
 
 
-class PayeeFinancialAccount(BaseXmlModel, tag="PayeeFinancialAccount", search_mode="unordered", ns="cac", nsmap=NSMAP):
-    id: Optional[str] = element(name="ID", default=None, ns="cbc", nsmap=NSMAP)
-    name: Optional[str] = element(name="Name", default=None, ns="cbc", nsmap=NSMAP)
+class PayeeFinancialAccount(FrozenXmlModel, tag="PayeeFinancialAccount", search_mode="unordered", ns="cac", nsmap=NSMAP):
+    id: Optional[str] = cbc("ID", default=None)
+    name: Optional[str] = cbc("Name", default=None)
     financial_institution_branch: Optional[FinancialInstitutionBranch] = None
 
 
-class PaymentMeans(BaseXmlModel, tag="PaymentMeans", search_mode="unordered", ns="cac", nsmap=NSMAP):
-    payment_means_code: Optional[str] = element(name="PaymentMeansCode", default=None, ns="cbc", nsmap=NSMAP)
-    payment_id: Optional[str] = element(name="PaymentID", default=None, ns="cbc", nsmap=NSMAP)
+class PaymentMeans(FrozenXmlModel, tag="PaymentMeans", search_mode="unordered", ns="cac", nsmap=NSMAP):
+    payment_means_code: Optional[str] = cbc("PaymentMeansCode", default=None)
+    payment_id: Optional[str] = cbc("PaymentID", default=None)
     payee_financial_account: Optional[PayeeFinancialAccount] = None
+
+    _intern_codes = field_validator("payment_means_code")(intern_code)
@@ -1,21 +1,59 @@
 import datetime
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import cached_property, lru_cache, partial
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterable, List, Mapping, Optional
 
-from pydantic_xml import BaseXmlModel, element, wrapped
-from rich.pretty import pprint
+from lxml import etree
+from pydantic import field_validator
+from pydantic_xml import ParsingError, wrapped
 
 from libanaf.ubl.cac import (
     AdditionalDocumentReference,
+    Attachment,
+    FrozenXmlModel,
     InvoiceLine,
     LegalMonetaryTotal,
     OrderReference,
     Party,
+    PartyLegalEntity,
+    PartyName,
     PaymentMeans,
     TaxTotal,
+    cac,
+    cbc,
+    intern_code,
 )
 from libanaf.ubl.types import NSMAP
 
+# characters not allowed (or unwanted) in file names, each replaced by `replace_char`
+_SANITIZE_CHARS: str = r"[/\\?`&%*:|\"<>\x7F\x00-\x1F,.\s]"
+_CENT = Decimal('0.01')
+
+_INVOICE_TAG: str = '{%s}Invoice' % NSMAP['']
+# shared by every parse in the process: no ID table, no entity expansion and no whitespace-only text nodes
+_PARSER = etree.XMLParser(collect_ids=False, resolve_entities=False, remove_blank_text=True)
+# XPath has no notion of a default namespace, only the prefixed ones can be used
+_XPATH_NS: dict[str, str] = {prefix: uri for prefix, uri in NSMAP.items() if prefix}
+# the fields read by the lightweight parse (see `parse_ubl_invoice(..., full=False)`), as plain `str`s:
+# lxml's default "smart" strings keep a reference to their element, and with it the whole tree
+_XP_ID = etree.XPath("string(cbc:ID)", namespaces=_XPATH_NS, smart_strings=False)
+_XP_ISSUE_DATE = etree.XPath("string(cbc:IssueDate)", namespaces=_XPATH_NS, smart_strings=False)
+_XP_PAYABLE_AMOUNT = etree.XPath(
+    "string(cac:LegalMonetaryTotal/cbc:PayableAmount)", namespaces=_XPATH_NS, smart_strings=False)
+_XP_SUPPLIER_NAME = etree.XPath(
+    "string(cac:AccountingSupplierParty/cac:Party/cac:PartyName/cbc:Name)",
+    namespaces=_XPATH_NS, smart_strings=False)
+_XP_SUPPLIER_REGISTRATION_NAME = etree.XPath(
+    "string(cac:AccountingSupplierParty/cac:Party/cac:PartyLegalEntity/cbc:RegistrationName)",
+    namespaces=_XPATH_NS, smart_strings=False)
+# like the model, which only reads the first AdditionalDocumentReference
+_XP_ATTACHMENT = etree.XPath(
+    "cac:AdditionalDocumentReference[1]/cac:Attachment/cbc:EmbeddedDocumentBinaryObject/text()",
+    namespaces=_XPATH_NS, smart_strings=False)
+
 """
 Pydantic Model for UBL invoices - incomplete (it's huge in reality)
 
@@ -25,56 +63,53 @@ see: https://www.truugo.com/ubl/2.1/invoice/
      https://docs.oasis-open.org/ubl/os-UBL-2.1/xsd/maindoc/UBL-Invoice-2.1.xsd
 """
 
-class AccountingSupplierParty(BaseXmlModel, tag='AccountingSupplierParty', ns='cac', nsmap=NSMAP):
+@lru_cache(maxsize=None)
+def _sanitize_re(replace_char: str) -> re.Pattern:
+    """
+    A single pattern matching runs of unwanted characters and `replace_char` itself, so that
+    replacing and collapsing the runs into one `replace_char` is done in one pass.
+    """
+    return re.compile('(?:%s|%s)+' % (_SANITIZE_CHARS, re.escape(replace_char)))
+
+class AccountingSupplierParty(FrozenXmlModel, tag='AccountingSupplierParty', ns='cac', nsmap=NSMAP):
     party: Party
 
-class AccountingCustomerParty(BaseXmlModel, tag='AccountingCustomerParty', ns='cac', nsmap=NSMAP):
+class AccountingCustomerParty(FrozenXmlModel, tag='AccountingCustomerParty', ns='cac', nsmap=NSMAP):
     party: Party
 
 
-class Invoice(BaseXmlModel, tag='Invoice', search_mode='unordered', ns='', nsmap=NSMAP):
-    ubl_version_id: Optional[str] = element(tag='UBLVersionID', default=None, ns='cbc', nsmap=NSMAP)
-    customization_id: Optional[str] = element(tag='CustomizationID', default=None, ns='cbc', nsmap=NSMAP)
-    profile_id: Optional[str] = element(tag='ProfileID', default=None, ns='cbc', nsmap=NSMAP)
-    profile_excution_id: Optional[str] = element(tag='ProfileExecutionID', default=None, ns='cbc', nsmap=NSMAP)
-    id: str = element(tag='ID', ns='cbc', nsmap=NSMAP)
-    issue_date: datetime.date = element(tag='IssueDate', ns = 'cbc', nsmap=NSMAP)
-    issue_time: Optional[datetime.time] = element(tag='IssueTime', default=None, ns = 'cbc', nsmap=NSMAP)
-    due_date: Optional[datetime.date] = element(tag='DueDate', default=None, ns = 'cbc', nsmap=NSMAP)
-    invoice_type_code: Optional[str] = element(tag='InvoiceTypeCode', default=None, ns = 'cbc', nsmap=NSMAP)
-    note: Optional[List[str]] = element(tag='Note', default=None, ns='cbc', nsmap=NSMAP)
-    tax_point_date: Optional[str] = element(tag='TaxPointDate', default=None, ns='cbc', nsmap=NSMAP)
-    document_currency_code: str = element(tag='DocumentCurrencyCode', ns = 'cbc', nsmap=NSMAP)
+class Invoice(FrozenXmlModel, tag='Invoice', search_mode='unordered', ns='', nsmap=NSMAP):
+    ubl_version_id: Optional[str] = cbc('UBLVersionID', default=None)
+    customization_id: Optional[str] = cbc('CustomizationID', default=None)
+    profile_id: Optional[str] = cbc('ProfileID', default=None)
+    profile_excution_id: Optional[str] = cbc('ProfileExecutionID', default=None)
+    id: str = cbc('ID')
+    issue_date: datetime.date = cbc('IssueDate')
+    issue_time: Optional[datetime.time] = cbc('IssueTime', default=None)
+    due_date: Optional[datetime.date] = cbc('DueDate', default=None)
+    invoice_type_code: Optional[str] = cbc('InvoiceTypeCode', default=None)
+    note: Optional[List[str]] = cbc('Note', default=None)
+    tax_point_date: Optional[str] = cbc('TaxPointDate', default=None)
+    document_currency_code: str = cbc('DocumentCurrencyCode')
     order_reference: Optional[OrderReference] = None
     contract_document_reference: Optional[str] = wrapped('ContractDocumentReference', ns='cac', nsmap=NSMAP, default=None,
-                                              entity=element(tag='ID', default=None, ns='cbc', nsmap=NSMAP))
+                                              entity=cbc('ID', default=None))
     additional_document_reference: Optional[AdditionalDocumentReference] = None
-    tax_currency_code: Optional[str] = element(tag='DocumentCurrencyCode', default=None, ns = 'cbc', nsmap=NSMAP)
+    tax_currency_code: Optional[str] = cbc('DocumentCurrencyCode', default=None)
     accounting_supplier_party: AccountingSupplierParty
     accounting_customer_party: AccountingCustomerParty
-    payment_means: List[PaymentMeans] = element(tag='PaymentMeans', default=None, ns='cac', nsmap=NSMAP)
+    payment_means: Optional[List[PaymentMeans]] = cac('PaymentMeans', default=None)
     tax_total: TaxTotal
     legal_monetary_total: LegalMonetaryTotal
     invoice_line: List[InvoiceLine]
 
-    def _sanitize_file_name(self, *dirty, glue: str = '_', replace_char: str = '-') -> str:
-        import re
-
-        parts: list[str] = list()
-        for part in dirty:
-            part = part.strip().replace('.', '')
-            # part = re.sub(r"[[:space]]", replace_char, part)
-            part = re.sub(r"[/\\?`&%*:|\"<>\x7F\x00-\x1F,.\s]", replace_char, part)
-            pattern = replace_char + "+"
-            part = re.sub(pattern, replace_char, part)
-
-            parts.append(part)
+    _intern_codes = field_validator('invoice_type_code', 'document_currency_code', 'tax_currency_code')(intern_code)
 
-        # dirty = dirty.strip().replace('.', '')
-        # clean: str = re.sub(r"[/\\?%*:|\"<>\x7F\x00-\x1F.]\*", "-", dirty.strip())
-
-        return glue.join(parts)
+    def _sanitize_file_name(self, *dirty, glue: str = '_', replace_char: str = '-') -> str:
+        sanitize: re.Pattern = _sanitize_re(replace_char)
+        return glue.join([sanitize.sub(replace_char, part.strip().replace('.', '')) for part in dirty])
 
+    @cached_property
     def tofname(self) -> str:
         supplier_party: Party = self.accounting_supplier_party.party
         if supplier_party.party_name is not None and supplier_party.party_name.name is not None:
@@ -89,33 +124,119 @@ class Invoice(BaseXmlModel, tag='Invoice', search_mode='unordered', ns='', nsmap
         # supplier_name = supplier_name.strip()
         no: str = self.id # .strip() #.replace(' ', '-')
         dt = str(self.issue_date) # .strip()
-        amt: str = '{:.2f}'.format(self.legal_monetary_total.payable_amount)
+        # amounts are rounded half up
+        amt: str = str(self.legal_monetary_total.payable_amount.quantize(_CENT, rounding=ROUND_HALF_UP))
 
         # return self._sanitize_file_name('_'.join([supplier_name, dt, no])) + '_' + amt
         return self._sanitize_file_name(supplier_name, dt, no, glue='_') + '_' + amt
 
+    @cached_property
     def has_attachment(self) -> bool:
-        return self.additional_document_reference is not None and \
-                self.additional_document_reference.attachment is not None and \
-                self.additional_document_reference.attachment.embedded_binary_document is not None
+        return (reference := self.additional_document_reference) is not None and \
+                (attachment := reference.attachment) is not None and \
+                attachment.embedded_binary_document is not None
 
     def write_attachment(self, destination: Path) -> None:
-        with open(destination, 'wb') as dest:
-            dest.write(self.additional_document_reference.attachment.embedded_binary_document)
+        self.additional_document_reference.attachment.write_to(destination)
+
+def _parse_ubl_invoice_summary(root: etree._Element) -> Invoice:
+    """
+    Build an `Invoice` holding only what `tofname()` and the attachment helpers use, read with
+    precompiled XPath expressions and assembled with `model_construct()`, i.e. without validation.
 
-def parse_ubl_invoice(xml_path: Path):
+    Raises `ParsingError` when one of those fields is missing or malformed, as nothing else checks them.
+    """
+    invoice_id: str = _XP_ID(root)
+    supplier_name: str = _XP_SUPPLIER_NAME(root)
+    registration_name: str = _XP_SUPPLIER_REGISTRATION_NAME(root)
+    if not invoice_id or not (supplier_name or registration_name):
+        raise ParsingError("invoice has no ID or no supplier name")
+
+    try:
+        issue_date: datetime.date = datetime.date.fromisoformat(_XP_ISSUE_DATE(root))
+        payable_amount: Decimal = Decimal(_XP_PAYABLE_AMOUNT(root))
+    except (ValueError, InvalidOperation) as e:
+        raise ParsingError(f"invalid or missing IssueDate / PayableAmount: {e}") from e
+
+    supplier_party: Party = Party.model_construct(
+        party_name=PartyName.model_construct(name=supplier_name) if supplier_name else None,
+        party_legal_entity=PartyLegalEntity.model_construct(registration_name=registration_name or None),
+    )
+
+    attachment: list[str] = _XP_ATTACHMENT(root)
+    additional_document_reference: Optional[AdditionalDocumentReference] = None
+    if attachment:
+        additional_document_reference = AdditionalDocumentReference.model_construct(
+            attachment=Attachment.model_construct(embedded_binary_document=attachment[0]))
+
+    return Invoice.model_construct(
+        id=invoice_id,
+        issue_date=issue_date,
+        accounting_supplier_party=AccountingSupplierParty.model_construct(party=supplier_party),
+        additional_document_reference=additional_document_reference,
+        legal_monetary_total=LegalMonetaryTotal.model_construct(payable_amount=payable_amount),
+    )
+
+def parse_ubl_invoice(xml_path: Path, full: bool = True) -> Invoice:
     """
     Parse a UBL XML invoice and extract relevant information using pydantic-xml.
+
+    With `full=False` the pydantic-xml model walk and validation are skipped and only the
+    id, issue date, supplier name, payable amount and attachment are read, which is all that
+    `tofname()`, `has_attachment()` and `write_attachment()` need. Other fields are left unset.
     """
-    with xml_path.open('r', encoding='utf-8') as file:
-        invoice: Invoice = Invoice.from_xml(bytes(file.read(), encoding="utf8"))
-    
-    return invoice
+    # let libxml2 read the file itself and hand the tree over, no intermediate copy of the document
+    root: etree._Element = etree.parse(str(xml_path), _PARSER).getroot()
+    if full:
+        return Invoice.from_xml_tree(root)
+
+    if root.tag != _INVOICE_TAG:
+        raise ParsingError(f"root element is not an Invoice: {root.tag}")
+
+    return _parse_ubl_invoice_summary(root)
+
+def parse_ubl_invoices(xml_paths: Iterable[Path], workers: Optional[int] = None, full: bool = True) -> List[Invoice]:
+    """
+    Parse many UBL XML invoices in parallel, using one process per CPU by default.
+
+    Parsing is CPU bound and holds the GIL, so worker processes are used instead of threads.
+    Where workers are spawned rather than forked (Windows, macOS) each one re-imports this module.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(partial(parse_ubl_invoice, full=full), xml_paths, chunksize=8))
+
+def write_attachments(invoices: Mapping[Path, Invoice], destination_dir: Optional[Path] = None,
+                      workers: Optional[int] = None) -> List[Path]:
+    """
+    Write each invoice's embedded document (keyed by XML path) to `<xml stem>_<tofname>_attachment.pdf`.
+    Raises `ValueError` before writing anything if a destination is taken, in the batch or on disk.
+    """
+    attached: List[Invoice] = []
+    destinations: List[Path] = []
+    seen: set[Path] = set()
+    for xml_path, invoice in invoices.items():
+        if not invoice.has_attachment:
+            continue
+
+        # never the name of the converted PDF (see `libanaf.invoices.process.get_pdf_path`)
+        name: str = f"{xml_path.stem}_{invoice.tofname}_attachment.pdf"
+        destination: Path = (destination_dir or xml_path.parent) / name
+        if destination in seen or destination.exists():
+            raise ValueError(f"{xml_path}: attachment would overwrite {destination}")
+
+        seen.add(destination)
+        attached.append(invoice)
+        destinations.append(destination)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # list() so an error in any of the writes is raised here
+        list(executor.map(Invoice.write_attachment, attached, destinations))
+
+    return destinations
 
 if __name__ == "__main__":
-    # xml_file = Path("/home/catalin/work/libanaf/dlds/3472340796_4291809720.xml")
-    # xml_file = Path("/home/catalin/work/libanaf/dlds/3516049667_4314748999.xml")
-    # xml_file = Path("/home/catalin/work/libanaf/dlds/3433627391_4271778395.xml")
-    xml_file = Path("/home/catalin/work/libanaf/dlds/3444171368_4277109404.xml")
-    invoice: Invoice = parse_ubl_invoice(xml_file)
-    pprint(invoice)
+    import sys
+
+    for invoice in parse_ubl_invoices([Path(arg) for arg in sys.argv[1:]]):
+        sys.stdout.write(invoice.model_dump_json(indent=2))
+        sys.stdout.write('\n')
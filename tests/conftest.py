@@ -0,0 +1,22 @@
+from pathlib import Path
+from typing import Callable, Mapping, Optional
+
+import pytest
+
+FIXTURES = (Path(__file__).parent / "fixtures").resolve()
+
+
+@pytest.fixture
+def fixture_variant(tmp_path: Path) -> Callable[..., Path]:
+    """Writes `fixtures/invoice.xml` to `tmp_path / name`, with each `replacements` key replaced by its value."""
+
+    def make(replacements: Optional[Mapping[bytes, bytes]] = None, name: str = "invoice.xml") -> Path:
+        content = (FIXTURES / "invoice.xml").read_bytes()
+        for old, new in (replacements or {}).items():
+            content = content.replace(old, new)
+
+        xml_path = tmp_path / name
+        xml_path.write_bytes(content)
+        return xml_path
+
+    return make
@@ -0,0 +1,26 @@
+import pytest
+
+from conftest import FIXTURES
+from libanaf.ubl.arrays import InvoiceLineArray
+from libanaf.ubl.invoice import parse_ubl_invoice
+
+
+def test_invoice_line_array_columns() -> None:
+    invoice = parse_ubl_invoice(FIXTURES / "invoice.xml")
+    lines = InvoiceLineArray.from_invoices([invoice, invoice])
+
+    assert len(lines) == 4
+    assert lines.invoice_id == ["FCT 0042"] * 4
+    assert lines.id == ["1", "2", "1", "2"]
+    assert list(lines.invoiced_quantity) == [2.0, 1.0, 2.0, 1.0]
+    assert list(lines.price_amount) == [100.0, 50.0, 100.0, 50.0]
+    assert sum(lines.line_extension_amount) == pytest.approx(2 * float(invoice.legal_monetary_total.line_extension_amount))
+
+
+def test_invoice_line_array_copies_invoice_ids() -> None:
+    invoice = parse_ubl_invoice(FIXTURES / "invoice.xml")
+    invoice_ids = [invoice.id] * len(invoice.invoice_line)
+    lines = InvoiceLineArray(invoice.invoice_line, invoice_ids)
+
+    invoice_ids.clear()
+    assert lines.invoice_id == ["FCT 0042"] * 2
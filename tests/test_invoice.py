@@ -0,0 +1,214 @@
+import datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from pydantic import ValidationError
+from pydantic_xml import ParsingError
+
+from conftest import FIXTURES
+from libanaf.ubl.cac import Attachment
+from libanaf.ubl.invoice import (
+    Invoice,
+    parse_ubl_invoice,
+    parse_ubl_invoices,
+    write_attachments,
+)
+
+
+@pytest.fixture(scope="module")
+def invoice() -> Invoice:
+    return parse_ubl_invoice(FIXTURES / "invoice.xml")
+
+
+def test_parse_header(invoice: Invoice) -> None:
+    assert invoice.id == "FCT 0042"
+    assert invoice.issue_date == datetime.date(2024, 6, 13)
+    assert invoice.due_date == datetime.date(2024, 7, 13)
+    assert invoice.document_currency_code == "RON"
+    assert invoice.contract_document_reference == "CTR-2024/1"
+
+
+def test_parse_party_with_reordered_children(invoice: Invoice) -> None:
+    # the customer party lists PartyLegalEntity before PostalAddress and
+    # CountrySubentity before StreetName, out of UBL schema order
+    party = invoice.accounting_customer_party.party
+    assert party.party_legal_entity.registration_name == "BETA SOFT SRL"
+    assert party.postal_address.street_name == "Str. Memorandumului 1"
+    assert party.postal_address.city_name == "Cluj-Napoca"
+    assert party.postal_address.country_subentity == "RO-CJ"
+    assert party.party_tax_scheme.company_id == "RO19507820"
+
+
+def test_parse_lines_skip_unmodelled_elements(invoice: Invoice) -> None:
+    first, second = invoice.invoice_line
+    assert first.item.name == "Hartie A4 80g"
+    assert first.item.seller_item_id == "HA4-80"
+    assert first.item.origin_country == "RO"
+    assert first.item.commodity_classification.list_id == "STI"
+    assert first.item.classified_tax_category.percent == 19.0
+    assert second.note == ["Livrare"]
+    assert second.price.base_quantity == 1.0
+
+
+def test_parse_totals(invoice: Invoice) -> None:
+    totals = invoice.legal_monetary_total
+    assert totals.line_extension_amount == Decimal("250.00")
+    assert totals.tax_inclusive_amount == Decimal("297.50")
+    assert totals.allowance_total_amount == Decimal(0)
+    assert totals.payable_amount == Decimal("297.50")
+    assert invoice.tax_total.tax_amount + totals.tax_exclusive_amount == totals.tax_inclusive_amount
+    assert sum(line.line_extension_amount for line in invoice.invoice_line) == totals.line_extension_amount
+    assert invoice.payment_means[0].payment_means_code == "31"
+
+
+def test_tofname(invoice: Invoice) -> None:
+    assert invoice.tofname == "ALFA-OMEGA-DISTRIBUTIE-SRL_2024-06-13_FCT-0042_297.50"
+
+
+@pytest.mark.parametrize(
+    ("parts", "kwargs", "expected"),
+    [
+        ((' a/b c?d*e:f|g\\h<i>j"k<l>m ',), {}, "a-b-c-d-e-f-g-h-i-j-k-l-m"),
+        ((" part1/ ", " part2? ", " part3* "), {}, "part1-_part2-_part3-"),
+        (("S.C. ALFA, BETA  S.R.L.",), {}, "SC-ALFA-BETA-SRL"),
+        (("A -- B",), {}, "A-B"),
+        (("a\tb\x00c\x7fd",), {}, "a-b-c-d"),
+        (("a b", "c d"), {"glue": "+", "replace_char": "_"}, "a_b+c_d"),
+    ],
+)
+def test_sanitize_file_name(invoice: Invoice, parts: tuple[str, ...], kwargs: dict, expected: str) -> None:
+    assert invoice._sanitize_file_name(*parts, **kwargs) == expected
+
+
+def test_tofname_rounds_amount_half_up(fixture_variant: Callable[..., Path]) -> None:
+    xml_path = fixture_variant({b">297.50</cbc:PayableAmount>": b">2.675</cbc:PayableAmount>"})
+    assert parse_ubl_invoice(xml_path, full=False).tofname.endswith("_2.68")
+
+
+def test_invoice_is_frozen(invoice: Invoice) -> None:
+    with pytest.raises(ValidationError):
+        invoice.id = "FCT 0043"
+    with pytest.raises(ValidationError):
+        invoice.legal_monetary_total.payable_amount = Decimal("1")
+    with pytest.raises(ValidationError):
+        invoice.accounting_supplier_party.party.party_name.name = "OTHER SRL"
+    with pytest.raises(ValidationError):
+        invoice.additional_document_reference.attachment.embedded_binary_document = None
+
+
+def test_model_copy_drops_cached_values(invoice: Invoice) -> None:
+    assert invoice.tofname and invoice.has_attachment
+
+    copy = invoice.model_copy(update={"id": "FCT 0043", "additional_document_reference": None})
+    assert copy.tofname == "ALFA-OMEGA-DISTRIBUTIE-SRL_2024-06-13_FCT-0043_297.50"
+    assert not copy.has_attachment
+
+    attachment = invoice.additional_document_reference.attachment
+    assert attachment.embedded_binary_document_bytes
+    assert attachment.model_copy(update={"embedded_binary_document": None}).embedded_binary_document_bytes == b""
+
+
+def test_write_attachment(invoice: Invoice, tmp_path: Path) -> None:
+    assert invoice.has_attachment
+    destination = tmp_path / "invoice.pdf"
+    invoice.write_attachment(destination)
+
+    content = destination.read_bytes()
+    assert content.startswith(b"%PDF-1.4") and content.endswith(b"%%EOF\n")
+    assert content == invoice.additional_document_reference.attachment.embedded_binary_document_bytes
+
+
+def test_attachment_without_document(tmp_path: Path) -> None:
+    attachment = Attachment()
+    assert attachment.embedded_binary_document_bytes == b""
+
+    destination = tmp_path / "invoice.pdf"
+    with pytest.raises(ValueError):
+        attachment.write_to(destination)
+    assert not destination.exists()
+
+
+def test_write_attachments(invoice: Invoice, tmp_path: Path, fixture_variant: Callable[..., Path]) -> None:
+    other_path = fixture_variant({b"FCT 0042": b"FCT 0043"}, name="other.xml")
+    other = parse_ubl_invoice(other_path, full=False)
+
+    written = write_attachments({FIXTURES / "invoice.xml": invoice, other_path: other}, tmp_path)
+
+    assert written == [
+        tmp_path / f"invoice_{invoice.tofname}_attachment.pdf",
+        tmp_path / f"other_{other.tofname}_attachment.pdf",
+    ]
+    for destination in written:
+        assert destination.read_bytes() == invoice.additional_document_reference.attachment.embedded_binary_document_bytes
+
+
+def test_write_attachments_refuses_name_collisions(invoice: Invoice, tmp_path: Path) -> None:
+    copy_path = tmp_path / "copy" / "invoice.xml"
+    with pytest.raises(ValueError):
+        write_attachments({FIXTURES / "invoice.xml": invoice, copy_path: invoice}, tmp_path)
+
+    assert not list(tmp_path.glob("*.pdf"))
+
+
+def test_write_attachments_keeps_existing_files(invoice: Invoice, tmp_path: Path) -> None:
+    converted = tmp_path / f"invoice_{invoice.tofname}.pdf"
+    converted.write_bytes(b"converted")
+    write_attachments({FIXTURES / "invoice.xml": invoice}, tmp_path)
+    assert converted.read_bytes() == b"converted"
+
+    with pytest.raises(ValueError):
+        write_attachments({FIXTURES / "invoice.xml": invoice}, tmp_path)
+
+
+_REFERENCE = b"  <cac:AdditionalDocumentReference>\n    <cbc:ID>FCT 0042.pdf</cbc:ID>"
+_CONTRACT_REFERENCE = (
+    b"  <cac:AdditionalDocumentReference>\n    <cbc:ID>CTR-2024/1</cbc:ID>\n  </cac:AdditionalDocumentReference>\n"
+)
+
+
+@pytest.mark.parametrize(
+    ("replacements", "has_attachment"),
+    [
+        ({}, True),
+        # a reference without an attachment ahead of the one with the PDF
+        ({_REFERENCE: _CONTRACT_REFERENCE + _REFERENCE}, False),
+    ],
+)
+def test_parse_summary_matches_full_parse(fixture_variant: Callable[..., Path], tmp_path: Path,
+                                          replacements: dict[bytes, bytes], has_attachment: bool) -> None:
+    xml_path = fixture_variant(replacements)
+    invoice = parse_ubl_invoice(xml_path)
+    summary = parse_ubl_invoice(xml_path, full=False)
+
+    assert summary.tofname == invoice.tofname
+    assert type(summary.id) is str
+    assert summary.has_attachment == invoice.has_attachment == has_attachment
+    if not has_attachment:
+        return
+
+    assert type(summary.additional_document_reference.attachment.embedded_binary_document) is str
+    destination = tmp_path / "invoice.pdf"
+    summary.write_attachment(destination)
+    assert destination.read_bytes() == invoice.additional_document_reference.attachment.embedded_binary_document_bytes
+
+
+@pytest.mark.parametrize("element", [b"cbc:PayableAmount", b"cbc:IssueDate", b"cbc:ID"])
+def test_parse_summary_missing_field(fixture_variant: Callable[..., Path], element: bytes) -> None:
+    # renaming the element hides it from the lightweight parse, the document stays well formed
+    xml_path = fixture_variant({element: element + b"X"})
+
+    with pytest.raises(ParsingError):
+        parse_ubl_invoice(xml_path, full=False)
+
+
+@pytest.mark.parametrize("full", [True, False])
+def test_parse_ubl_invoices(invoice: Invoice, fixture_variant: Callable[..., Path], full: bool) -> None:
+    other_path = fixture_variant({b"FCT 0042": b"FCT 0043"}, name="other.xml")
+
+    first, second = parse_ubl_invoices([other_path, FIXTURES / "invoice.xml"], workers=2, full=full)
+
+    assert (first.id, second.id) == ("FCT 0043", "FCT 0042")
+    assert first.tofname == "ALFA-OMEGA-DISTRIBUTIE-SRL_2024-06-13_FCT-0043_297.50"
+    assert second.tofname == invoice.tofname
@@ -0,0 +1,29 @@
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from conftest import FIXTURES
+from libanaf.invoices.process import get_pdf_path, list_xml_files
+
+
+def test_get_pdf_path() -> None:
+    assert get_pdf_path(FIXTURES / "invoice.xml") == \
+        FIXTURES / "invoice_ALFA-OMEGA-DISTRIBUTIE-SRL_2024-06-13_FCT-0042_297.50.pdf"
+
+
+def test_get_pdf_path_falls_back_to_the_xml_name(fixture_variant: Callable[..., Path],
+                                                 caplog: pytest.LogCaptureFixture) -> None:
+    xml_path = fixture_variant({b"cbc:PayableAmount": b"cbc:PayableAmountX"}, name="broken.xml")
+
+    assert get_pdf_path(xml_path) == xml_path.parent / "broken.pdf"
+    assert "XML Parse error" in caplog.text
+
+
+def test_list_xml_files(tmp_path: Path, fixture_variant: Callable[..., Path]) -> None:
+    fixture_variant()
+    (tmp_path / "empty.xml").touch()
+    (tmp_path / "invoice.zip").write_bytes(b"PK")
+    (tmp_path / "folder.xml").mkdir()
+
+    assert list_xml_files(tmp_path) == [tmp_path / "invoice.xml"]